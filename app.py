@@ -1,17 +1,42 @@
 
 # app.py
 try:
-    from flask import Flask, jsonify, request, send_from_directory
+    from flask import Flask, abort, g, jsonify, request, send_from_directory
+    from flask.json.provider import JSONProvider
 except ModuleNotFoundError:
     raise SystemExit(
         "Missing dependency 'flask'. Install dependencies with: py -3 -m pip install -r requirements.txt"
     )
 
-from src.library import Library
+from src.library import Library, MAX_BATCH_SIZE
+import orjson
 import os
-from datetime import datetime
+import time
+from datetime import datetime, timedelta
+
+
+
+class OrjsonProvider(JSONProvider):
+    # encodes every jsonify() response with orjson; loads() only backs Flask's request.get_json()
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=str).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        # hand the encoded bytes straight to the response, skipping the str round-trip
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(orjson.dumps(obj, default=str), mimetype="application/json")
+
+
+# request bodies larger than this are rejected with 413
+MAX_JSON_BYTES = 64 * 1024
 
 app = Flask(__name__, static_folder="src/static", static_url_path="/")
+app.json = OrjsonProvider(app)
+# lets Werkzeug refuse oversized bodies before reading them
+app.config["MAX_CONTENT_LENGTH"] = MAX_JSON_BYTES
 # allow CORS (safe for local dev). If Flask-Cors isn't installed we continue without it
 try:
     from flask_cors import CORS
@@ -23,16 +48,40 @@ except Exception:
     print("Warning: flask_cors not installed; proceeding without Flask-Cors. To enable, run: py -3 -m pip install Flask-Cors")
 
 
-@app.after_request
+CORS_HEADERS = (
+    ('Access-Control-Allow-Origin', '*'),
+    ('Access-Control-Allow-Methods', 'GET, POST, PUT, DELETE, OPTIONS'),
+    ('Access-Control-Allow-Headers', 'Content-Type, Authorization'),
+)
+
+
 def add_cors_headers(response):
     # Ensure all necessary CORS headers are present for debugging
-    response.headers.setdefault('Access-Control-Allow-Origin', '*')
-    response.headers.setdefault('Access-Control-Allow-Methods', 'GET, POST, PUT, DELETE, OPTIONS')
-    response.headers.setdefault('Access-Control-Allow-Headers', 'Content-Type, Authorization')
+    headers = response.headers
+    for name, value in CORS_HEADERS:
+        headers.setdefault(name, value)
     return response
 
+
+# Flask-Cors already sets these; only fall back to the manual hook without it
+if not cors_enabled:
+    app.after_request(add_cors_headers)
+
 library = Library(loan_days=14)
 
+
+def _json():
+    # parse the request body once with orjson and keep it on `g` for anything else that needs it
+    if "json_body" not in g:
+        raw = request.get_data(cache=False)
+        if len(raw) > MAX_JSON_BYTES:
+            abort(413)
+        try:
+            g.json_body = orjson.loads(raw)
+        except orjson.JSONDecodeError:
+            abort(400, description="Request body must be valid JSON")
+    return g.json_body
+
 # ---- Serve frontend ----
 @app.route("/")
 def index():
@@ -42,10 +91,9 @@ def index():
 @app.route("/api/books", methods=["GET", "POST"])
 def books():
     if request.method == "GET":
-        books = [b.to_dict() for b in library.list_books()]
-        return jsonify({"books": books}), 200
+        return jsonify({"books": [b.to_dict() for b in library.list_books()]}), 200
     else:
-        data = request.get_json()
+        data = _json()
         required = ["title", "author", "isbn", "genre", "quantity"]
         for r in required:
             if r not in data:
@@ -70,7 +118,7 @@ def book_detail(isbn):
             return jsonify({"error": "Book not found"}), 404
         return jsonify({"book": book.to_dict()}), 200
     elif request.method == "PUT":
-        data = request.get_json()
+        data = _json()
         try:
             book = library.update_book(isbn, **data)
             return jsonify({"book": book.to_dict()}), 200
@@ -89,13 +137,19 @@ def book_detail(isbn):
 @app.route("/api/borrowers", methods=["GET", "POST"])
 def borrowers():
     if request.method == "GET":
-        borrowers = [b.to_dict() for b in library.list_borrowers()]
-        return jsonify({"borrowers": borrowers}), 200
+        contact = request.args.get("contact")
+        if contact is not None:
+            borrower = library.get_borrower_by_contact(contact)
+            return jsonify({"borrowers": [borrower.to_dict()] if borrower else []}), 200
+        return jsonify({"borrowers": [b.to_dict() for b in library.list_borrowers()]}), 200
     else:
-        data = request.get_json()
+        data = _json()
         if not data.get("name") or not data.get("contact"):
             return jsonify({"error": "Missing name or contact"}), 400
-        borrower = library.add_borrower(name=data["name"], contact=data["contact"], membership_id=data.get("membership_id"))
+        try:
+            borrower = library.add_borrower(name=data["name"], contact=data["contact"], membership_id=data.get("membership_id"))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 409
         return jsonify({"borrower": borrower.to_dict()}), 201
 
 @app.route("/api/borrowers/<membership_id>", methods=["GET", "PUT", "DELETE"])
@@ -106,12 +160,14 @@ def borrower_detail(membership_id):
             return jsonify({"error": "Borrower not found"}), 404
         return jsonify({"borrower": borrower.to_dict()}), 200
     elif request.method == "PUT":
-        data = request.get_json()
+        data = _json()
         try:
             borrower = library.update_borrower(membership_id, **data)
             return jsonify({"borrower": borrower.to_dict()}), 200
         except KeyError:
             return jsonify({"error": "Borrower not found"}), 404
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 409
     else:
         try:
             library.remove_borrower(membership_id)
@@ -122,7 +178,7 @@ def borrower_detail(membership_id):
 # ---- Borrow & return ----
 @app.route("/api/borrow", methods=["POST"])
 def borrow():
-    data = request.get_json()
+    data = _json()
     if not data or "membership_id" not in data or "isbn" not in data:
         return jsonify({"error": "membership_id and isbn required"}), 400
     try:
@@ -137,7 +193,7 @@ def borrow():
 
 @app.route("/api/return", methods=["POST"])
 def return_book():
-    data = request.get_json()
+    data = _json()
     if not data or "membership_id" not in data or "isbn" not in data:
         return jsonify({"error": "membership_id and isbn required"}), 400
     try:
@@ -150,12 +206,40 @@ def return_book():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+def _batch_pairs(data):
+    # returns (pairs, error) for a {"items": [{membership_id, isbn}, ...]} body
+    items = data.get("items") if isinstance(data, dict) else None
+    if not isinstance(items, list) or not items:
+        return None, "items must be a non-empty list"
+    if len(items) > MAX_BATCH_SIZE:
+        return None, f"At most {MAX_BATCH_SIZE} items per batch"
+    # values are passed through as-is; Library._bulk reports malformed ones as that item's error
+    pairs = [(i.get("membership_id"), i.get("isbn")) if isinstance(i, dict) else (None, None) for i in items]
+    return pairs, None
+
+@app.route("/api/borrow/batch", methods=["POST"])
+def borrow_batch():
+    pairs, error = _batch_pairs(_json())
+    if error:
+        return jsonify({"error": error}), 400
+    return jsonify({"results": library.borrow_books_bulk(pairs)}), 200
+
+@app.route("/api/return/batch", methods=["POST"])
+def return_batch():
+    pairs, error = _batch_pairs(_json())
+    if error:
+        return jsonify({"error": error}), 400
+    return jsonify({"results": library.return_books_bulk(pairs)}), 200
+
 # ---- Search ----
 @app.route("/api/search", methods=["GET"])
 def search():
     q = request.args.get("q", "")
     field = request.args.get("field", "title")
-    results = library.search_books(query=q, field=field)
+    if field == "author" and request.args.get("exact") == "1":
+        results = library.books_by_author(q)
+    else:
+        results = library.search_books(query=q, field=field)
     return jsonify({"results": [b.to_dict() for b in results]}), 200
 
 # ---- Availability ----
@@ -167,21 +251,48 @@ def availability(isbn):
     except KeyError:
         return jsonify({"error": "Book not found"}), 404
 
+# ---- Overdue loans ----
+@app.route("/api/overdue", methods=["GET"])
+def overdue():
+    # ?summary=1 returns just the count, which is a single bisect over the sorted loans
+    if request.args.get("summary") == "1":
+        return jsonify({"count": library.count_overdue()}), 200
+    loans = library.overdue_loans()
+    return jsonify({"count": len(loans), "overdue": loans}), 200
+
+@app.route("/api/due", methods=["GET"])
+def due_soon():
+    # loans falling due within the next `days` days (default: one week)
+    try:
+        days = int(request.args.get("days", 7))
+    except ValueError:
+        return jsonify({"error": "days must be an integer"}), 400
+    now = datetime.now()
+    loans = library.loans_due_between(now, now + timedelta(days=days))
+    return jsonify({"count": len(loans), "due": loans}), 200
+
 # ---- Debug route to seed data (optional) ----
 @app.route("/api/seed", methods=["POST"])
 def seed():
     try:
         library.add_book(title="1984", author="George Orwell", isbn="9780451524935", genre="Dystopia", quantity=3)
         library.add_book(title="Python Crash Course", author="Eric Matthes", isbn="9781593279288", genre="Programming", quantity=2)
-        b = library.add_borrower(name="Alice", contact="alice@example.com")
+        b = library.get_borrower_by_contact("alice@example.com") or library.add_borrower(name="Alice", contact="alice@example.com")
         return jsonify({"seeded": True, "sample_borrower": b.to_dict()}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
+# [timestamp, iso string] of the last formatted ping time; refreshed at most every 100 ms
+_ping_time = [0.0, ""]
+
+
 @app.route('/api/ping', methods=['GET'])
 def ping():
-    return jsonify({'status': 'ok', 'time': datetime.utcnow().isoformat()}), 200
+    t = time.time()
+    if t - _ping_time[0] > 0.1:
+        _ping_time[:] = [t, datetime.utcfromtimestamp(t).isoformat()]
+    return jsonify({'status': 'ok', 'time': _ping_time[1]}), 200
 
 
 @app.route('/api/headers', methods=['GET'])
@@ -1,18 +1,32 @@
 # src/book.py
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass, field
 
-@dataclass
+@dataclass(slots=True)
 class Book:
     title: str
     author: str
     isbn: str
     genre: str
     quantity: int
+    # cached to_dict() result, cleared by update()
+    _dict_cache: dict = field(default=None, init=False, repr=False, compare=False)
 
     def to_dict(self):
-        return asdict(self)
+        if self._dict_cache is None:
+            self._dict_cache = {
+                "title": self.title,
+                "author": self.author,
+                "isbn": self.isbn,
+                "genre": self.genre,
+                "quantity": self.quantity
+            }
+        return self._dict_cache
 
     def update(self, title=None, author=None, genre=None, quantity=None):
+        # validate before assigning anything so a rejected update leaves the book untouched
+        if quantity is not None and quantity < 0:
+            raise ValueError("Quantity cannot be negative")
+        self._dict_cache = None
         if title is not None:
             self.title = title
         if author is not None:
@@ -20,8 +34,6 @@ class Book:
         if genre is not None:
             self.genre = genre
         if quantity is not None:
-            if quantity < 0:
-                raise ValueError("Quantity cannot be negative")
             self.quantity = quantity
 
     def is_available(self):
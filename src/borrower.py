@@ -1,41 +1,55 @@
 # src/borrower.py
-from dataclasses import dataclass, asdict
-from typing import List
+from dataclasses import dataclass, field
+from typing import Dict, List
 import uuid
 from datetime import datetime
 
-@dataclass
+@dataclass(slots=True)
 class BorrowedRecord:
     isbn: str
     borrowed_on: datetime
     due_date: datetime
+    # records never change after creation, so to_dict() is computed once
+    _dict_cache: dict = field(default=None, init=False, repr=False, compare=False)
 
     def to_dict(self):
-        return {
-            "isbn": self.isbn,
-            "borrowed_on": self.borrowed_on.isoformat(),
-            "due_date": self.due_date.isoformat()
-        }
+        if self._dict_cache is None:
+            self._dict_cache = {
+                "isbn": self.isbn,
+                "borrowed_on": self.borrowed_on.isoformat(),
+                "due_date": self.due_date.isoformat()
+            }
+        return self._dict_cache
 
-@dataclass
+@dataclass(slots=True)
 class Borrower:
     name: str
     contact: str
     membership_id: str = None
-    borrowed_books: List[BorrowedRecord] = None
+    # isbn -> active loans of that isbn, oldest first; returns are a single dict lookup
+    borrowed_books: Dict[str, List[BorrowedRecord]] = None
+    _base_cache: dict = field(default=None, init=False, repr=False, compare=False)
 
     def __post_init__(self):
         if not self.membership_id:
             self.membership_id = str(uuid.uuid4())[:8]
         if self.borrowed_books is None:
-            self.borrowed_books = []
+            self.borrowed_books = {}
+        self._refresh_base_cache()
 
-    def to_dict(self):
-        return {
+    def _refresh_base_cache(self):
+        # scalar fields only change through update(), so they are prebuilt here
+        self._base_cache = {
             "name": self.name,
             "contact": self.contact,
-            "membership_id": self.membership_id,
-            "borrowed_books": [b.to_dict() for b in self.borrowed_books]
+            "membership_id": self.membership_id
+        }
+
+    def to_dict(self):
+        return {
+            **self._base_cache,
+            # copy first: borrow/return can change the dict while a response is being built
+            "borrowed_books": [b.to_dict() for recs in list(self.borrowed_books.values()) for b in list(recs)]
         }
 
     def update(self, name=None, contact=None):
@@ -43,3 +57,4 @@ class Borrower:
             self.name = name
         if contact:
             self.contact = contact
+        self._refresh_base_cache()
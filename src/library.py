@@ -2,51 +2,119 @@
 from datetime import datetime, timedelta
 from src.book import Book
 from src.borrower import Borrower, BorrowedRecord
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 from pathlib import Path
-import json
+from bisect import bisect_left, bisect_right
+from functools import lru_cache
+import atexit
+import mmap
+import os
+import orjson
+import queue
+import threading
+import time
 
 
 DEFAULT_DATA_FILE = Path(__file__).resolve().parents[1] / "data.json"
+# the write-ahead log is folded into a fresh data.json snapshot every SNAPSHOT_INTERVAL
+# seconds, or sooner once SNAPSHOT_EVERY operations have been logged
+SNAPSHOT_INTERVAL = 60
+SNAPSHOT_EVERY = 1000
+# Book attributes search_books() can match against; field="any" matches any of them
+SEARCH_FIELDS = ("title", "author", "genre")
+# upper bound on items accepted by the bulk borrow/return calls
+MAX_BATCH_SIZE = 100
+
+
+def _is_key(value) -> bool:
+    return isinstance(value, str) and bool(value)
+
+
+@lru_cache(maxsize=2048)
+def _availability(isbn: str, quantity: int) -> dict:
+    # the quantity is part of the key, so a borrow/return naturally misses the cache;
+    # callers share the returned dict and must not mutate it
+    return {"isbn": isbn, "available_copies": quantity}
 
 
 class Library:
-    def __init__(self, loan_days: int = 14, data_file: Optional[str] = None):
+    def __init__(self, loan_days: int = 14, data_file: Optional[str] = None, fsync_wal: bool = False):
         # books_by_isbn: isbn -> Book
         self.books_by_isbn: Dict[str, Book] = {}
         # borrowers_by_id: membership_id -> Borrower
         self.borrowers_by_id: Dict[str, Borrower] = {}
+        # lowercased search fields: field -> (isbn -> value); refreshed whenever a book changes
+        # "any" holds the fields joined by NUL, so a multi-field search is still one `in` test per book
+        self._lc_cache: Dict[str, Dict[str, str]] = {f: {} for f in SEARCH_FIELDS + ("any",)}
+        # lowercased author -> (isbn -> Book) for exact author lookups
+        self._books_by_author: Dict[str, Dict[str, Book]] = {}
+        # contact -> Borrower; contacts are unique, like membership ids
+        self._borrower_by_contact: Dict[str, Borrower] = {}
+        # all active loans as parallel lists sorted by due date; built lazily, then kept
+        # up to date by borrow/return (None = rebuild on next query)
+        self._loan_arrays: Optional[Tuple[List[float], List[str], List[BorrowedRecord]]] = None
         self.loan_days = loan_days
         self.data_path = Path(data_file) if data_file else DEFAULT_DATA_FILE
+        # every mutation is appended here as one JSON line; replayed on top of data.json at startup
+        self.wal_path = self.data_path.with_suffix('.wal')
+        # fsync each WAL append (durable across power loss, slower) instead of just flushing it
+        self.fsync_wal = fsync_wal
+        # guards the in-memory dicts; held by every mutation and while a snapshot is taken
+        self._lock = threading.RLock()
+        # guards the WAL file; only the writer thread and snapshots touch it
+        self._io_lock = threading.Lock()
+        # (generation, encoded WAL line) pairs, drained in batches by the writer thread so
+        # request threads never wait on disk I/O
+        self._writeq = queue.Queue()
+        # bumped by each snapshot and stamped on data.json and on every WAL line; lines older
+        # than _durable_gen are already in data.json (skipped on replay, dropped from the queue)
+        self._wal_gen = 0
+        self._durable_gen = 0
+        # operations logged since the last snapshot
+        self._pending_ops = 0
         # load existing data (if any)
         self._load()
+        self._wal = self.wal_path.open('ab')
+        # create file if missing
+        if not self.data_path.exists():
+            self._write_snapshot()
+        threading.Thread(target=self._writer_loop, name="library-writer", daemon=True).start()
+        atexit.register(self._snapshot_if_pending)
 
     # ---- Book management ----
     def add_book(self, title: str, author: str, isbn: str, genre: str, quantity: int):
-        if isbn in self.books_by_isbn:
-            # If exists, increment quantity
-            book = self.books_by_isbn[isbn]
-            book.update(quantity=book.quantity + quantity)
-        else:
-            book = Book(title=title, author=author, isbn=isbn, genre=genre, quantity=quantity)
-            self.books_by_isbn[isbn] = book
-        self._save()
-        return book
+        with self._lock:
+            if isbn in self.books_by_isbn:
+                # If exists, increment quantity
+                book = self.books_by_isbn[isbn]
+                book.update(quantity=book.quantity + quantity)
+            else:
+                book = Book(title=title, author=author, isbn=isbn, genre=genre, quantity=quantity)
+                self.books_by_isbn[isbn] = book
+                self._index_book(book)
+            self._log({"op": "put_book", "book": book.to_dict()})
+            return book
 
     def update_book(self, isbn: str, **kwargs):
-        if isbn not in self.books_by_isbn:
-            raise KeyError("Book not found")
-        book = self.books_by_isbn[isbn]
-        book.update(**kwargs)
-        self._save()
-        return book
+        with self._lock:
+            if isbn not in self.books_by_isbn:
+                raise KeyError("Book not found")
+            book = self.books_by_isbn[isbn]
+            try:
+                book.update(**kwargs)
+            finally:
+                self._index_book(book)
+            self._log({"op": "put_book", "book": book.to_dict()})
+            return book
 
     def remove_book(self, isbn: str):
-        if isbn not in self.books_by_isbn:
-            raise KeyError("Book not found")
-        del self.books_by_isbn[isbn]
-        self._save()
-        return True
+        with self._lock:
+            if isbn not in self.books_by_isbn:
+                raise KeyError("Book not found")
+            del self.books_by_isbn[isbn]
+            self._unindex_book(isbn)
+            self._log({"op": "del_book", "isbn": isbn})
+            return True
 
     def get_book(self, isbn: str) -> Optional[Book]:
         return self.books_by_isbn.get(isbn)
@@ -54,36 +122,100 @@ class Library:
     def list_books(self) -> List[Book]:
         return list(self.books_by_isbn.values())
 
+    def books_by_author(self, author: str) -> List[Book]:
+        # exact (case-insensitive) author match: one hash probe instead of a catalog scan
+        with self._lock:
+            return list(self._books_by_author.get(author.strip().lower(), {}).values())
+
     # ---- Borrower management ----
     def add_borrower(self, name: str, contact: str, membership_id: str = None):
-        borrower = Borrower(name=name, contact=contact, membership_id=membership_id)
-        self.borrowers_by_id[borrower.membership_id] = borrower
-        self._save()
-        return borrower
+        with self._lock:
+            if membership_id and membership_id in self.borrowers_by_id:
+                raise ValueError("Membership ID already exists")
+            if contact in self._borrower_by_contact:
+                raise ValueError("Contact already registered")
+            borrower = Borrower(name=name, contact=contact, membership_id=membership_id)
+            self.borrowers_by_id[borrower.membership_id] = borrower
+            self._index_borrower(borrower)
+            self._log({"op": "put_borrower", "borrower": borrower.to_dict()})
+            return borrower
 
     def update_borrower(self, membership_id: str, **kwargs):
-        if membership_id not in self.borrowers_by_id:
-            raise KeyError("Borrower not found")
-        borrower = self.borrowers_by_id[membership_id]
-        borrower.update(**kwargs)
-        self._save()
-        return borrower
+        with self._lock:
+            if membership_id not in self.borrowers_by_id:
+                raise KeyError("Borrower not found")
+            borrower = self.borrowers_by_id[membership_id]
+            contact = kwargs.get("contact")
+            if contact and contact != borrower.contact and contact in self._borrower_by_contact:
+                raise ValueError("Contact already registered")
+            self._unindex_borrower(borrower)
+            try:
+                borrower.update(**kwargs)
+            finally:
+                self._index_borrower(borrower)
+            self._log({"op": "put_borrower", "borrower": borrower.to_dict()})
+            return borrower
 
     def remove_borrower(self, membership_id: str):
-        if membership_id not in self.borrowers_by_id:
-            raise KeyError("Borrower not found")
-        del self.borrowers_by_id[membership_id]
-        self._save()
-        return True
+        with self._lock:
+            if membership_id not in self.borrowers_by_id:
+                raise KeyError("Borrower not found")
+            self._unindex_borrower(self.borrowers_by_id.pop(membership_id))
+            self._loan_arrays = None
+            self._log({"op": "del_borrower", "membership_id": membership_id})
+            return True
 
     def get_borrower(self, membership_id: str) -> Optional[Borrower]:
         return self.borrowers_by_id.get(membership_id)
 
+    def get_borrower_by_contact(self, contact: str) -> Optional[Borrower]:
+        return self._borrower_by_contact.get(contact)
+
+    def _index_borrower(self, borrower: Borrower):
+        self._borrower_by_contact[borrower.contact] = borrower
+
+    def _unindex_borrower(self, borrower: Borrower):
+        # only drop the entry if it still points at this borrower
+        if self._borrower_by_contact.get(borrower.contact) is borrower:
+            del self._borrower_by_contact[borrower.contact]
+
     def list_borrowers(self) -> List[Borrower]:
         return list(self.borrowers_by_id.values())
 
     # ---- Borrow / Return ----
     def borrow_book(self, membership_id: str, isbn: str):
+        with self._lock:
+            return self._borrow(membership_id, isbn)
+
+    def return_book(self, membership_id: str, isbn: str):
+        with self._lock:
+            return self._return(membership_id, isbn)
+
+    def borrow_books_bulk(self, pairs: List[Tuple[str, str]]) -> List[dict]:
+        # all borrows run under one lock acquisition
+        return self._bulk(self._borrow, pairs, lambda record: {"ok": True, "borrowed": record.to_dict()})
+
+    def return_books_bulk(self, pairs: List[Tuple[str, str]]) -> List[dict]:
+        return self._bulk(self._return, pairs, lambda res: {"ok": True, **res})
+
+    def _bulk(self, op, pairs, on_success):
+        if len(pairs) > MAX_BATCH_SIZE:
+            raise ValueError(f"At most {MAX_BATCH_SIZE} items per batch")
+        results = []
+        with self._lock:
+            for membership_id, isbn in pairs:
+                if not _is_key(membership_id) or not _is_key(isbn):
+                    results.append({"ok": False, "error": "membership_id and isbn must be non-empty strings"})
+                    continue
+                try:
+                    results.append(on_success(op(membership_id, isbn)))
+                except Exception as e:
+                    # one bad item must not abort the batch: earlier items are already applied
+                    results.append({"ok": False, "error": str(e)})
+        return results
+
+    # _borrow/_return expect the caller to hold self._lock
+    def _borrow(self, membership_id: str, isbn: str):
         if membership_id not in self.borrowers_by_id:
             raise KeyError("Borrower not found")
         if isbn not in self.books_by_isbn:
@@ -99,101 +231,274 @@ class Library:
         due_date = borrowed_on + timedelta(days=self.loan_days)
         record = BorrowedRecord(isbn=isbn, borrowed_on=borrowed_on, due_date=due_date)
 
-        borrower.borrowed_books.append(record)
-        book.quantity -= 1
-        self._save()
+        borrower.borrowed_books.setdefault(isbn, []).append(record)
+        book.update(quantity=book.quantity - 1)
+        self._track_loan(membership_id, record)
+        self._log({"op": "put_book", "book": book.to_dict()})
+        self._log({"op": "put_borrower", "borrower": borrower.to_dict()})
         return record
 
-    def return_book(self, membership_id: str, isbn: str):
+    def _return(self, membership_id: str, isbn: str):
         if membership_id not in self.borrowers_by_id:
             raise KeyError("Borrower not found")
         if isbn not in self.books_by_isbn:
             raise KeyError("Book not found")
 
         borrower = self.borrowers_by_id[membership_id]
-        # Find the borrowed record
-        found = None
-        for rec in borrower.borrowed_books:
-            if rec.isbn == isbn:
-                found = rec
-                break
-        if not found:
+        recs = borrower.borrowed_books.get(isbn)
+        if not recs:
             raise ValueError("This borrower did not borrow this book")
+        # return the oldest copy first
+        found = recs.pop(0)
+        if not recs:
+            del borrower.borrowed_books[isbn]
 
-        borrower.borrowed_books.remove(found)
-        self.books_by_isbn[isbn].quantity += 1
-        self._save()
+        book = self.books_by_isbn[isbn]
+        book.update(quantity=book.quantity + 1)
+        self._untrack_loan(found)
+        self._log({"op": "put_book", "book": book.to_dict()})
+        self._log({"op": "put_borrower", "borrower": borrower.to_dict()})
         # check overdue
         now = datetime.now()
         overdue = now > found.due_date
         return {"returned": True, "overdue": overdue, "due_date": found.due_date.isoformat()}
 
+    # ---- Loan analytics ----
+    def _loan_index(self):
+        # (due_ts, membership_ids, records) for every active loan, sorted by due_ts.
+        # Callers must hold self._lock while reading it, since borrow/return edit it in place.
+        if self._loan_arrays is None:
+            loans = sorted(
+                ((rec.due_date.timestamp(), borrower.membership_id, rec)
+                 for borrower in self.borrowers_by_id.values()
+                 for recs in borrower.borrowed_books.values()
+                 for rec in recs),
+                key=lambda l: l[0]
+            )
+            self._loan_arrays = (
+                [l[0] for l in loans],
+                [l[1] for l in loans],
+                [l[2] for l in loans],
+            )
+        return self._loan_arrays
+
+    def _track_loan(self, membership_id: str, record: BorrowedRecord):
+        if self._loan_arrays is None:
+            return
+        due_ts, membership_ids, records = self._loan_arrays
+        ts = record.due_date.timestamp()
+        i = bisect_right(due_ts, ts)
+        due_ts.insert(i, ts)
+        membership_ids.insert(i, membership_id)
+        records.insert(i, record)
+
+    def _untrack_loan(self, record: BorrowedRecord):
+        if self._loan_arrays is None:
+            return
+        due_ts, membership_ids, records = self._loan_arrays
+        ts = record.due_date.timestamp()
+        for i in range(bisect_left(due_ts, ts), bisect_right(due_ts, ts)):
+            if records[i] is record:
+                del due_ts[i], membership_ids[i], records[i]
+                return
+
+    def _loans_between(self, start_ts: float, end_ts: float) -> List[dict]:
+        with self._lock:
+            due_ts, membership_ids, records = self._loan_index()
+            lo = bisect_left(due_ts, start_ts)
+            hi = bisect_left(due_ts, end_ts)
+            return [{"membership_id": membership_ids[i], **records[i].to_dict()} for i in range(lo, hi)]
+
+    def count_overdue(self, now: Optional[datetime] = None) -> int:
+        with self._lock:
+            # loans are sorted by due date, so the overdue ones are a prefix
+            return bisect_left(self._loan_index()[0], (now or datetime.now()).timestamp())
+
+    def overdue_loans(self, now: Optional[datetime] = None) -> List[dict]:
+        return self._loans_between(float("-inf"), (now or datetime.now()).timestamp())
+
+    def loans_due_between(self, start: datetime, end: datetime) -> List[dict]:
+        # active loans with start <= due_date < end, soonest first
+        return self._loans_between(start.timestamp(), end.timestamp())
+
     # ---- Persistence ----
     def _load(self):
-        # create file if missing
-        if not self.data_path.exists():
-            self._save()
-            return
-        try:
-            with self.data_path.open('r', encoding='utf-8') as f:
-                data = json.load(f)
-        except Exception:
-            data = {}
-
-        # load books
-        for b in data.get('books', []):
+        # data.json is the last snapshot; data.wal holds every operation logged after it
+        if self.data_path.exists():
+            try:
+                # parse straight from the mapped file: no str copy of data.json is ever built
+                with self.data_path.open('rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    data = orjson.loads(memoryview(mm))
+            except Exception:
+                data = {}
+            # files written before snapshots were stamped count as generation 0
+            self._wal_gen = self._durable_gen = data.get('generation', 0)
+
+            # load books
+            for b in data.get('books', []):
+                try:
+                    self._put_book(b)
+                except Exception:
+                    # skip malformed
+                    continue
+
+            # load borrowers
+            for br in data.get('borrowers', []):
+                try:
+                    self._put_borrower(br)
+                except Exception:
+                    continue
+
+        if self.wal_path.exists():
+            with self.wal_path.open('rb') as f:
+                for line in f:
+                    try:
+                        entry = orjson.loads(line)
+                        # older lines may survive a crash between the snapshot rename and
+                        # the truncate; their effects are already in data.json
+                        if entry.get('gen', 0) >= self._durable_gen:
+                            self._replay(entry)
+                    except Exception:
+                        # a torn last line from a crash mid-append
+                        continue
+
+    def _put_book(self, b: dict):
+        book = Book(**b)
+        self.books_by_isbn[book.isbn] = book
+        self._index_book(book)
+
+    def _put_borrower(self, br: dict):
+        borrowed = {}
+        for rec in br.get('borrowed_books', []):
+            record = BorrowedRecord(
+                isbn=rec['isbn'],
+                borrowed_on=datetime.fromisoformat(rec['borrowed_on']),
+                due_date=datetime.fromisoformat(rec['due_date'])
+            )
+            borrowed.setdefault(record.isbn, []).append(record)
+        borrower = Borrower(name=br['name'], contact=br['contact'], membership_id=br.get('membership_id'), borrowed_books=borrowed)
+        previous = self.borrowers_by_id.get(borrower.membership_id)
+        if previous is not None:
+            self._unindex_borrower(previous)
+        self.borrowers_by_id[borrower.membership_id] = borrower
+        self._index_borrower(borrower)
+
+    def _replay(self, entry: dict):
+        # entries carry the full record after the change, so replaying a line twice is harmless
+        op = entry['op']
+        if op == 'put_book':
+            self._put_book(entry['book'])
+        elif op == 'del_book':
+            self.books_by_isbn.pop(entry['isbn'], None)
+            self._unindex_book(entry['isbn'])
+        elif op == 'put_borrower':
+            self._put_borrower(entry['borrower'])
+        elif op == 'del_borrower':
+            borrower = self.borrowers_by_id.pop(entry['membership_id'], None)
+            if borrower is not None:
+                self._unindex_borrower(borrower)
+
+    def _log(self, entry: dict):
+        # caller holds self._lock, so queue order matches the order mutations were applied
+        entry['gen'] = self._wal_gen
+        self._writeq.put_nowait((self._wal_gen, orjson.dumps(entry) + b'\n'))
+        self._pending_ops += 1
+
+    def _writer_loop(self):
+        last_snapshot = time.monotonic()
+        while True:
+            timeout = max(0.0, SNAPSHOT_INTERVAL - (time.monotonic() - last_snapshot))
+            try:
+                batch = [self._writeq.get(timeout=timeout)]
+                # coalesce everything queued meanwhile into a single write (+ fsync)
+                while True:
+                    try:
+                        batch.append(self._writeq.get_nowait())
+                    except queue.Empty:
+                        break
+                self._append_wal(batch)
+            except queue.Empty:
+                pass
+            if self._pending_ops >= SNAPSHOT_EVERY or time.monotonic() - last_snapshot >= SNAPSHOT_INTERVAL:
+                self._snapshot_if_pending()
+                last_snapshot = time.monotonic()
+
+    def _append_wal(self, batch):
+        with self._io_lock:
+            lines = [line for gen, line in batch if gen >= self._durable_gen]
+            if not lines:
+                return
             try:
-                book = Book(**b)
-                self.books_by_isbn[book.isbn] = book
+                self._wal.write(b''.join(lines))
+                self._wal.flush()
+                if self.fsync_wal:
+                    os.fsync(self._wal.fileno())
             except Exception:
-                # skip malformed
-                continue
+                # best-effort: ignore save errors (could log)
+                pass
+
+    def _snapshot_if_pending(self):
+        if self._pending_ops:
+            self._write_snapshot()
 
-        # load borrowers
-        for br in data.get('borrowers', []):
+    def _write_snapshot(self):
+        with self._lock:
+            data = {
+                'books': [b.to_dict() for b in self.books_by_isbn.values()],
+                'borrowers': [br.to_dict() for br in self.borrowers_by_id.values()]
+            }
+            # everything logged so far is in `data`; later lines get the next generation
+            snapshot_gen = self._wal_gen = self._wal_gen + 1
+            data['generation'] = snapshot_gen
+            snapshot_ops = self._pending_ops
+        with self._io_lock:
+            tmp_path = self.data_path.with_name(self.data_path.name + '.tmp')
             try:
-                borrowed = []
-                for rec in br.get('borrowed_books', []):
-                    borrowed.append(BorrowedRecord(
-                        isbn=rec['isbn'],
-                        borrowed_on=datetime.fromisoformat(rec['borrowed_on']),
-                        due_date=datetime.fromisoformat(rec['due_date'])
-                    ))
-                borrower = Borrower(name=br['name'], contact=br['contact'], membership_id=br.get('membership_id'), borrowed_books=borrowed)
-                self.borrowers_by_id[borrower.membership_id] = borrower
+                # orjson emits UTF-8 bytes directly (non-ASCII is kept as-is, like ensure_ascii=False)
+                tmp_path.write_bytes(orjson.dumps(data, option=orjson.OPT_INDENT_2))
+                # atomic swap so a crash mid-write never leaves a truncated data.json
+                os.replace(tmp_path, self.data_path)
+                self._wal.truncate(0)
+                # lines from before the snapshot that are still queued can now be dropped
+                self._durable_gen = snapshot_gen
             except Exception:
-                continue
-
-    def _save(self):
-        data = {
-            'books': [b.to_dict() for b in self.books_by_isbn.values()],
-            'borrowers': [br.to_dict() for br in self.borrowers_by_id.values()]
-        }
-        try:
-            with self.data_path.open('w', encoding='utf-8') as f:
-                json.dump(data, f, indent=2, ensure_ascii=False)
-        except Exception:
-            # best-effort: ignore save errors (could log)
-            pass
+                # best-effort: ignore save errors (could log); the WAL still has everything
+                return
+        with self._lock:
+            self._pending_ops -= snapshot_ops
 
     # ---- Search & availability ----
+    def _index_book(self, book: Book):
+        # drop entries for the book's previous author (or a replaced Book object) first
+        self._unindex_book(book.isbn)
+        for field in SEARCH_FIELDS:
+            self._lc_cache[field][book.isbn] = getattr(book, field).lower()
+        self._lc_cache["any"][book.isbn] = "\0".join(self._lc_cache[f][book.isbn] for f in SEARCH_FIELDS)
+        self._books_by_author.setdefault(self._lc_cache["author"][book.isbn], {})[book.isbn] = book
+
+    def _unindex_book(self, isbn: str):
+        author = self._lc_cache["author"].get(isbn)
+        if author is not None:
+            books = self._books_by_author[author]
+            del books[isbn]
+            if not books:
+                del self._books_by_author[author]
+        for index in self._lc_cache.values():
+            index.pop(isbn, None)
+
     def search_books(self, query: str = "", field: str = "title"):
         q = query.strip().lower()
-        results = []
-        for book in self.books_by_isbn.values():
-            if not q:
-                results.append(book)
-                continue
-            if field == "title" and q in book.title.lower():
-                results.append(book)
-            elif field == "author" and q in book.author.lower():
-                results.append(book)
-            elif field == "genre" and q in book.genre.lower():
-                results.append(book)
-        return results
+        if not q:
+            return list(self.books_by_isbn.values())
+        index = self._lc_cache.get(field)
+        if index is None:
+            return []
+        books = self.books_by_isbn
+        with self._lock:
+            return [books[isbn] for isbn, value in index.items() if q in value]
 
     def availability(self, isbn: str):
         book = self.books_by_isbn.get(isbn)
         if not book:
             raise KeyError("Book not found")
-        return {"isbn": isbn, "available_copies": book.quantity}
+        return _availability(isbn, book.quantity)